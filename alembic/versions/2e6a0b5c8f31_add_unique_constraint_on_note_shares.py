@@ -0,0 +1,34 @@
+"""add unique constraint on note_shares note_id/user_id
+
+Revision ID: 2e6a0b5c8f31
+Revises: 9c1d7e3f2a64
+Create Date: 2026-10-14 10:05:47.318206
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '2e6a0b5c8f31'
+down_revision = '9c1d7e3f2a64'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Remove duplicate shares, keeping the oldest one for each (note_id, user_id)
+    op.execute(
+        """
+        DELETE FROM note_shares a
+        USING note_shares b
+        WHERE a.note_id = b.note_id
+          AND a.user_id = b.user_id
+          AND a.id > b.id
+        """
+    )
+    op.create_unique_constraint('uq_note_shares_note_user', 'note_shares', ['note_id', 'user_id'])
+
+
+def downgrade() -> None:
+    op.drop_constraint('uq_note_shares_note_user', 'note_shares', type_='unique')
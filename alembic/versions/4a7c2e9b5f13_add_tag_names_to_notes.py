@@ -0,0 +1,52 @@
+"""add tag_names to notes
+
+Revision ID: 4a7c2e9b5f13
+Revises: e6f2a9c4b1d3
+Create Date: 2026-10-14 12:41:08.503927
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '4a7c2e9b5f13'
+down_revision = 'e6f2a9c4b1d3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Denormalized tag names, read by the list endpoints instead of loading note_tags/tags
+    op.add_column(
+        'notes',
+        sa.Column('tag_names', postgresql.ARRAY(sa.String(length=50)), server_default='{}', nullable=False)
+    )
+
+    # Backfill from the existing tag associations
+    op.execute(
+        """
+        UPDATE notes
+        SET tag_names = sub.names
+        FROM (
+            SELECT nt.note_id, array_agg(t.name ORDER BY t.name) AS names
+            FROM note_tags nt
+            JOIN tags t ON t.id = nt.tag_id
+            GROUP BY nt.note_id
+        ) sub
+        WHERE sub.note_id = notes.id
+        """
+    )
+
+    # GIN index for the tag filter (tag_names && :names)
+    op.create_index('ix_notes_tag_names', 'notes', ['tag_names'], unique=False, postgresql_using='gin')
+
+    # The tag filter no longer joins note_tags from the tag side, and tags are never deleted
+    op.drop_index('ix_note_tags_tag_note', table_name='note_tags')
+
+
+def downgrade() -> None:
+    op.create_index('ix_note_tags_tag_note', 'note_tags', ['tag_id', 'note_id'], unique=False)
+    op.drop_index('ix_notes_tag_names', table_name='notes', postgresql_using='gin')
+    op.drop_column('notes', 'tag_names')
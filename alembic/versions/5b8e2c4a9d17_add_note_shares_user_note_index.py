@@ -0,0 +1,25 @@
+"""add note_shares user_id/note_id index
+
+Revision ID: 5b8e2c4a9d17
+Revises: f024d01f2994
+Create Date: 2026-10-14 09:12:31.204518
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5b8e2c4a9d17'
+down_revision = 'f024d01f2994'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Index used by the owned-or-shared join on the notes list
+    op.create_index('ix_note_shares_user_note', 'note_shares', ['user_id', 'note_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_note_shares_user_note', table_name='note_shares')
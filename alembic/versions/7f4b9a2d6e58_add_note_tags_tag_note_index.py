@@ -0,0 +1,25 @@
+"""add note_tags tag_id/note_id index
+
+Revision ID: 7f4b9a2d6e58
+Revises: 2e6a0b5c8f31
+Create Date: 2026-10-14 10:32:18.095344
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7f4b9a2d6e58'
+down_revision = '2e6a0b5c8f31'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # The (note_id, tag_id) primary key can't serve lookups by tag, used by the tag filter and /tags
+    op.create_index('ix_note_tags_tag_note', 'note_tags', ['tag_id', 'note_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_note_tags_tag_note', table_name='note_tags')
@@ -0,0 +1,30 @@
+"""cascade note_shares on note delete
+
+Revision ID: 8e1b4d7f2c90
+Revises: b5d3f8a1c6e7
+Create Date: 2026-10-14 13:22:47.659310
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8e1b4d7f2c90'
+down_revision = 'b5d3f8a1c6e7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Let the database remove a note's shares, like note_tags already does,
+    # so a note can be deleted with a single statement
+    op.drop_constraint('note_shares_note_id_fkey', 'note_shares', type_='foreignkey')
+    op.create_foreign_key(
+        'note_shares_note_id_fkey', 'note_shares', 'notes', ['note_id'], ['id'], ondelete='CASCADE'
+    )
+
+
+def downgrade() -> None:
+    op.drop_constraint('note_shares_note_id_fkey', 'note_shares', type_='foreignkey')
+    op.create_foreign_key('note_shares_note_id_fkey', 'note_shares', 'notes', ['note_id'], ['id'])
@@ -0,0 +1,25 @@
+"""add notes owner_id index
+
+Revision ID: 9c1d7e3f2a64
+Revises: 5b8e2c4a9d17
+Create Date: 2026-10-14 09:40:02.771930
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9c1d7e3f2a64'
+down_revision = '5b8e2c4a9d17'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Composite index so the owner check on a note can be answered from the index
+    op.create_index('ix_notes_owner_id', 'notes', ['owner_id', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_notes_owner_id', table_name='notes')
@@ -0,0 +1,28 @@
+"""replace notes owner_id index with owner_id, created_at, id
+
+Revision ID: b5d3f8a1c6e7
+Revises: 4a7c2e9b5f13
+Create Date: 2026-10-14 12:58:36.214805
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b5d3f8a1c6e7'
+down_revision = '4a7c2e9b5f13'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Lets the owner's notes be read already in (created_at, id) order; the owner_id
+    # prefix still serves plain owner lookups, so the old index becomes redundant
+    op.create_index('ix_notes_owner_created_at_id', 'notes', ['owner_id', 'created_at', 'id'], unique=False)
+    op.drop_index('ix_notes_owner_id', table_name='notes')
+
+
+def downgrade() -> None:
+    op.create_index('ix_notes_owner_id', 'notes', ['owner_id', 'id'], unique=False)
+    op.drop_index('ix_notes_owner_created_at_id', table_name='notes')
@@ -0,0 +1,25 @@
+"""add notes created_at/id index for keyset pagination
+
+Revision ID: c3a8f1e07b92
+Revises: 7f4b9a2d6e58
+Create Date: 2026-10-14 11:02:44.512873
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c3a8f1e07b92'
+down_revision = '7f4b9a2d6e58'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Lets ORDER BY created_at DESC, id DESC with a (created_at, id) < cursor filter use an index range scan
+    op.create_index('ix_notes_created_at_id', 'notes', ['created_at', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_notes_created_at_id', table_name='notes')
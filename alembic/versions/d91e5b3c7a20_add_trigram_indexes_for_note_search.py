@@ -0,0 +1,35 @@
+"""add trigram indexes for note search
+
+Revision ID: d91e5b3c7a20
+Revises: c3a8f1e07b92
+Create Date: 2026-10-14 11:48:09.660417
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd91e5b3c7a20'
+down_revision = 'c3a8f1e07b92'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # GIN trigram indexes let PostgreSQL serve ILIKE '%term%' from the index
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    op.create_index(
+        'ix_notes_title_trgm', 'notes', ['title'], unique=False,
+        postgresql_using='gin', postgresql_ops={'title': 'gin_trgm_ops'}
+    )
+    op.create_index(
+        'ix_notes_content_trgm', 'notes', ['content'], unique=False,
+        postgresql_using='gin', postgresql_ops={'content': 'gin_trgm_ops'}
+    )
+
+
+def downgrade() -> None:
+    # The pg_trgm extension is left installed, other objects may depend on it
+    op.drop_index('ix_notes_content_trgm', table_name='notes')
+    op.drop_index('ix_notes_title_trgm', table_name='notes')
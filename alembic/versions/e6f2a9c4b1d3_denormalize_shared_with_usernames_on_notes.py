@@ -0,0 +1,115 @@
+"""denormalize shared_with_usernames on notes
+
+Revision ID: e6f2a9c4b1d3
+Revises: d91e5b3c7a20
+Create Date: 2026-10-14 12:20:53.187462
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = 'e6f2a9c4b1d3'
+down_revision = 'd91e5b3c7a20'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        'notes',
+        sa.Column('shared_with_usernames', postgresql.ARRAY(sa.String(length=50)), server_default='{}', nullable=False)
+    )
+
+    # Usernames a note is shared with, excluding its owner, in sharing order
+    op.execute(
+        """
+        CREATE FUNCTION note_shared_with_usernames(p_note_id integer, p_owner_id integer)
+        RETURNS varchar(50)[] AS $$
+            SELECT COALESCE(array_agg(u.username ORDER BY ns.id), '{}')
+            FROM note_shares ns
+            JOIN users u ON u.id = ns.user_id
+            WHERE ns.note_id = p_note_id AND u.id <> p_owner_id
+        $$ LANGUAGE sql STABLE
+        """
+    )
+
+    # Keep the column in sync when a note is shared or unshared
+    op.execute(
+        """
+        CREATE FUNCTION note_shares_sync_shared_with() RETURNS trigger AS $$
+        DECLARE
+            v_note_id integer;
+        BEGIN
+            IF TG_OP = 'DELETE' THEN
+                v_note_id := OLD.note_id;
+            ELSE
+                v_note_id := NEW.note_id;
+            END IF;
+            -- Serialize concurrent share changes on the note: the UPDATE below then
+            -- runs with a snapshot that sees the shares committed by the others.
+            -- NO KEY UPDATE doesn't conflict with the KEY SHARE lock the note_id
+            -- foreign key check already took, which FOR UPDATE would deadlock on
+            PERFORM 1 FROM notes WHERE id = v_note_id FOR NO KEY UPDATE;
+            UPDATE notes
+            SET shared_with_usernames = note_shared_with_usernames(id, owner_id)
+            WHERE id = v_note_id;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER note_shares_sync_shared_with
+        AFTER INSERT OR DELETE ON note_shares
+        FOR EACH ROW EXECUTE FUNCTION note_shares_sync_shared_with()
+        """
+    )
+
+    # Keep the column in sync when a user the note is shared with is renamed
+    op.execute(
+        """
+        CREATE FUNCTION users_sync_shared_with() RETURNS trigger AS $$
+        BEGIN
+            -- Same locking as note_shares_sync_shared_with, in id order to avoid deadlocks
+            PERFORM 1 FROM notes
+            WHERE id IN (SELECT note_id FROM note_shares WHERE user_id = NEW.id)
+            ORDER BY id
+            FOR NO KEY UPDATE;
+            UPDATE notes
+            SET shared_with_usernames = note_shared_with_usernames(id, owner_id)
+            WHERE id IN (SELECT note_id FROM note_shares WHERE user_id = NEW.id);
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER users_sync_shared_with
+        AFTER UPDATE OF username ON users
+        FOR EACH ROW WHEN (OLD.username IS DISTINCT FROM NEW.username)
+        EXECUTE FUNCTION users_sync_shared_with()
+        """
+    )
+
+    # Backfill existing shares
+    op.execute(
+        """
+        UPDATE notes
+        SET shared_with_usernames = note_shared_with_usernames(id, owner_id)
+        WHERE id IN (SELECT note_id FROM note_shares)
+        """
+    )
+
+
+def downgrade() -> None:
+    op.execute('DROP TRIGGER IF EXISTS users_sync_shared_with ON users')
+    op.execute('DROP FUNCTION IF EXISTS users_sync_shared_with()')
+    op.execute('DROP TRIGGER IF EXISTS note_shares_sync_shared_with ON note_shares')
+    op.execute('DROP FUNCTION IF EXISTS note_shares_sync_shared_with()')
+    op.execute('DROP FUNCTION IF EXISTS note_shared_with_usernames(integer, integer)')
+    op.drop_column('notes', 'shared_with_usernames')
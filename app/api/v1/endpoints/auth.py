@@ -1,8 +1,11 @@
+import asyncio
 from datetime import timedelta
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from redis.asyncio import Redis
 
 from app.core.database import get_db
 from app.core.security import (
@@ -11,7 +14,8 @@ from app.core.security import (
     create_refresh_token,
     verify_token,
     get_password_hash,
-    get_current_user
+    get_current_user,
+    user_cache_key
 )
 from app.core.config import settings
 from app.core.redis_client import get_redis
@@ -21,40 +25,49 @@ from app.schemas.user import UserCreate, UserResponse
 
 router = APIRouter()
 
+# Token lifetimes, computed once from settings
+ACCESS_TOKEN_EXPIRES = timedelta(days=settings.ACCESS_TOKEN_EXPIRE_DAYS)
+ACCESS_TOKEN_TTL_SECONDS = int(ACCESS_TOKEN_EXPIRES.total_seconds())
+REFRESH_TOKEN_TTL_SECONDS = int(timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS).total_seconds())
+
 
 @router.post("/register", response_model=UserResponse)
 async def register(user: UserCreate, db: AsyncSession = Depends(get_db)):
     """Register a new user"""
-    # Check if user already exists
-    result = await db.execute(select(User).where(User.username == user.username))
-    if result.scalar_one_or_none():
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Username già registrato"
-        )
-    
-    
-    # Create new user
-    hashed_password = get_password_hash(user.password)
+    # Create new user, relying on the unique index on username to reject duplicates
+    # Hash in a worker thread so bcrypt doesn't block the event loop
+    hashed_password = await asyncio.to_thread(get_password_hash, user.password)
     db_user = User(
         username=user.username,
         hashed_password=hashed_password
     )
     db.add(db_user)
-    await db.commit()
+    try:
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Username già registrato"
+        )
     await db.refresh(db_user)
     
     return db_user
 
 
 @router.post("/login", response_model=Token)
-async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_db)):
+async def login(
+    form_data: OAuth2PasswordRequestForm = Depends(),
+    db: AsyncSession = Depends(get_db),
+    redis_client: Redis = Depends(get_redis)
+):
     """Login user and return JWT tokens"""
     # Get user from database
     result = await db.execute(select(User).where(User.username == form_data.username))
     user = result.scalar_one_or_none()
     
-    if not user or not verify_password(form_data.password, user.hashed_password):
+    # Verify in a worker thread so bcrypt doesn't block the event loop
+    if not user or not await asyncio.to_thread(verify_password, form_data.password, user.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Username o password non corretti",
@@ -68,24 +81,24 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSessi
         )
     
     # Create tokens
-    access_token_expires = timedelta(days=settings.ACCESS_TOKEN_EXPIRE_DAYS)
     access_token = create_access_token(
-        data={"sub": user.username}, expires_delta=access_token_expires
+        data={"sub": user.username}, expires_delta=ACCESS_TOKEN_EXPIRES
     )
     refresh_token = create_refresh_token(data={"sub": user.username})
     
     # Store tokens in Redis
-    redis_client = await get_redis()
-    await redis_client.setex(
-        f"access_token:{user.id}",
-        int(timedelta(days=settings.ACCESS_TOKEN_EXPIRE_DAYS).total_seconds()),
-        access_token
-    )
-    await redis_client.setex(
-        f"refresh_token:{user.id}",
-        int(timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS).total_seconds()),
-        refresh_token
-    )
+    async with redis_client.pipeline(transaction=False) as pipe:
+        pipe.setex(
+            f"access_token:{user.id}",
+            ACCESS_TOKEN_TTL_SECONDS,
+            access_token
+        )
+        pipe.setex(
+            f"refresh_token:{user.id}",
+            REFRESH_TOKEN_TTL_SECONDS,
+            refresh_token
+        )
+        await pipe.execute()
     
     return {
         "access_token": access_token,
@@ -95,7 +108,11 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSessi
 
 
 @router.post("/refresh", response_model=Token)
-async def refresh_token(refresh_token: str, db: AsyncSession = Depends(get_db)):
+async def refresh_token(
+    refresh_token: str,
+    db: AsyncSession = Depends(get_db),
+    redis_client: Redis = Depends(get_redis)
+):
     """Refresh access token using refresh token"""
     # Verify refresh token
     payload = verify_token(refresh_token, "refresh")
@@ -112,7 +129,6 @@ async def refresh_token(refresh_token: str, db: AsyncSession = Depends(get_db)):
         )
     
     # Check if refresh token exists in Redis
-    redis_client = await get_redis()
     stored_refresh_token = await redis_client.get(f"refresh_token:{user.id}")
     
     if not stored_refresh_token or stored_refresh_token != refresh_token:
@@ -122,15 +138,14 @@ async def refresh_token(refresh_token: str, db: AsyncSession = Depends(get_db)):
         )
     
     # Create new access token
-    access_token_expires = timedelta(days=settings.ACCESS_TOKEN_EXPIRE_DAYS)
     access_token = create_access_token(
-        data={"sub": user.username}, expires_delta=access_token_expires
+        data={"sub": user.username}, expires_delta=ACCESS_TOKEN_EXPIRES
     )
     
     # Update access token in Redis
     await redis_client.setex(
         f"access_token:{user.id}",
-        int(timedelta(days=settings.ACCESS_TOKEN_EXPIRE_DAYS).total_seconds()),
+        ACCESS_TOKEN_TTL_SECONDS,
         access_token
     )
     
@@ -142,11 +157,16 @@ async def refresh_token(refresh_token: str, db: AsyncSession = Depends(get_db)):
 
 
 @router.post("/logout")
-async def logout(current_user: User = Depends(get_current_user)):
+async def logout(
+    current_user: User = Depends(get_current_user),
+    redis_client: Redis = Depends(get_redis)
+):
     """Logout user by removing tokens from Redis"""
-    redis_client = await get_redis()
-    await redis_client.delete(f"access_token:{current_user.id}")
-    await redis_client.delete(f"refresh_token:{current_user.id}")
+    await redis_client.delete(
+        f"access_token:{current_user.id}",
+        f"refresh_token:{current_user.id}",
+        user_cache_key(current_user.username)
+    )
     
     return {"message": "Disconnesso con successo"}
 
@@ -1,75 +1,207 @@
-from typing import List
+from typing import Iterable, List, Optional, Tuple
+from datetime import datetime, timezone
+import base64
 import json
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Response
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, or_, and_
-from sqlalchemy.orm import selectinload
+from sqlalchemy import Select, select, delete, exists, or_, and_, tuple_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import selectinload, joinedload
+from sqlalchemy.orm.attributes import set_committed_value
+from redis.asyncio import Redis
+from redis.commands.core import AsyncScript
+from redis.exceptions import RedisError
 
 from app.core.database import get_db
+from app.core.redis_client import get_redis
 from app.core.security import get_current_active_user
 from app.models.user import User
 from app.models.note import Note
 from app.models.note_share import NoteShare
 from app.models.tag import Tag
-from app.models.note_tag import note_tags
-from app.schemas.note import NoteCreate, NoteUpdate, NoteResponse
+from app.schemas.note import NoteCreate, NoteUpdate, NoteResponse, note_list_adapter
 
 router = APIRouter()
 
+# Join the note owner for owner_username, loading only the username (and key) so
+# listings don't fetch password hashes
+owner_username_load = joinedload(Note.owner, innerjoin=True).load_only(User.username, raiseload=True)
+
+# Seconds a user's tag list stays cached, as a safety net for missed invalidations
+TAGS_CACHE_TTL_SECONDS = 600
+# Seconds a note stays cached for its readers; bounds staleness from changes that
+# don't invalidate it, such as a shared-with user being renamed
+NOTE_CACHE_TTL_SECONDS = 30
+# Stores a reader's entry and expires the whole hash from its first entry, so later
+# readers don't extend it; runs atomically and, unlike EXPIRE NX, on Redis < 7 too.
+# The SHA is computed once here and the script runs via EVALSHA, reloaded on NOSCRIPT;
+# given as bytes so no client is needed to encode it, the client is passed per call
+cache_note_script = AsyncScript(None, b"""
+redis.call('HSET', KEYS[1], ARGV[1], ARGV[2])
+if redis.call('TTL', KEYS[1]) < 0 then
+    redis.call('EXPIRE', KEYS[1], ARGV[3])
+end
+""")
+
+
+def normalize_tag_names(tag_names: Iterable[str]) -> List[str]:
+    """Normalize tag names once, dropping empty and duplicate entries while keeping input order"""
+    normalized = (tag_name.strip().lower() for tag_name in tag_names)
+    return list(dict.fromkeys(tag_name for tag_name in normalized if tag_name))
+
+
+def parse_tag_csv(tags: Optional[str]) -> List[str]:
+    """Parse the comma-separated tags query parameter into normalized tag names"""
+    return normalize_tag_names(tags.split(",")) if tags else []
+
 
 async def get_or_create_tags(tag_names: List[str], db: AsyncSession) -> List[Tag]:
     """Get existing tags or create new ones"""
-    if not tag_names:
+    names = normalize_tag_names(tag_names)
+    if not names:
         return []
     
-    tags = []
-    for tag_name in tag_names:
-        tag_name = tag_name.strip().lower()
-        if not tag_name:
-            continue
-            
-        # Try to get existing tag
-        result = await db.execute(select(Tag).where(Tag.name == tag_name))
-        tag = result.scalar_one_or_none()
-        
-        if not tag:
-            # Create new tag
-            tag = Tag(name=tag_name)
-            db.add(tag)
-            await db.flush()  # Flush to get the ID
+    # Fetch all existing tags in a single query
+    result = await db.execute(select(Tag).where(Tag.name.in_(names)))
+    tags_by_name = {tag.name: tag for tag in result.scalars().all()}
+    
+    missing = [name for name in names if name not in tags_by_name]
+    if missing:
+        # Create missing tags in one statement, getting the new rows back directly
+        result = await db.scalars(
+            pg_insert(Tag)
+            .values([{"name": name} for name in missing])
+            .on_conflict_do_nothing(index_elements=["name"])
+            .returning(Tag)
+        )
+        tags_by_name.update({tag.name: tag for tag in result.all()})
         
-        tags.append(tag)
+        # Tags created concurrently by another request are skipped by the insert, fetch them
+        raced = [name for name in missing if name not in tags_by_name]
+        if raced:
+            result = await db.execute(select(Tag).where(Tag.name.in_(raced)))
+            tags_by_name.update({tag.name: tag for tag in result.scalars().all()})
     
-    return tags
+    return [tags_by_name[name] for name in names]
 
 
-def tags_to_names(tags) -> List[str]:
-    """Convert Tag objects to list of tag names"""
-    if not tags:
-        return []
-    
-    # Convert SQLAlchemy relationship to list of tag names
-    return [tag.name for tag in tags]
+async def user_owns_note(note_id: int, user_id: int, db: AsyncSession) -> bool:
+    """Check whether a user owns a note without loading the note itself"""
+    return await db.scalar(
+        select(exists().where(and_(Note.id == note_id, Note.owner_id == user_id)))
+    )
 
 
-async def get_shared_with_usernames(note_id: int, owner_id: int, db: AsyncSession) -> List[str]:
-    """Get list of usernames who have access to a note (excluding the owner)"""
-    from app.models.user import User
-    
-    result = await db.execute(
-        select(User.username)
-        .join(NoteShare)
-        .where(and_(NoteShare.note_id == note_id, User.id != owner_id))
+def accessible_notes_query(user_id: int) -> Select:
+    """Build a single query for the notes a user owns or that are shared with them"""
+    return (
+        select(Note)
+        .options(owner_username_load)
+        .outerjoin(NoteShare, and_(Note.id == NoteShare.note_id, NoteShare.user_id == user_id))
+        .where(
+            or_(
+                Note.owner_id == user_id,  # User's own notes
+                NoteShare.user_id == user_id,  # Notes shared with user
+            )
+        )
     )
-    usernames = [row[0] for row in result.fetchall()]
-    return usernames
+
+
+def tags_cache_key(user_id: int) -> str:
+    """Redis key holding the cached tag list of a user's own notes"""
+    return f"tags:user:{user_id}"
+
+
+async def invalidate_tags_cache(user_id: int, redis_client: Redis) -> None:
+    """Drop the cached tag list of a user, ignoring Redis failures"""
+    try:
+        await redis_client.delete(tags_cache_key(user_id))
+    except RedisError:
+        pass
+
+
+def serialize_note(note: Note) -> str:
+    """Serialize an ORM note as a NoteResponse JSON document"""
+    return NoteResponse.model_validate(note).model_dump_json()
+
+
+def note_cache_key(note_id: int) -> str:
+    """Redis hash holding a note's serialized response, one field per authorized reader"""
+    return f"note:{note_id}"
+
+
+async def invalidate_note_cache(note_id: int, redis_client: Redis) -> None:
+    """Drop the cached responses of a note for all its readers, ignoring Redis failures"""
+    try:
+        await redis_client.delete(note_cache_key(note_id))
+    except RedisError:
+        pass
+
+
+# Largest value of the int4 notes.id column
+MAX_NOTE_ID = 2**31 - 1
+
+
+def encode_cursor(note: Note) -> str:
+    """Encode the (created_at, id) position of a note as an opaque pagination cursor"""
+    raw = json.dumps([note.created_at.isoformat(), note.id])
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Decode a pagination cursor into its (created_at, id) position"""
+    try:
+        created_at, note_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        created_at, note_id = datetime.fromisoformat(created_at), int(note_id)
+        # Reject positions the timestamptz/int4 comparison can't take
+        if created_at.tzinfo is None or not 1 <= note_id <= MAX_NOTE_ID:
+            raise ValueError("cursor position out of range")
+        # Normalize to UTC here, as asyncpg would, so offsets pushing the date out of
+        # range raise OverflowError now instead of at execute time
+        return created_at.astimezone(timezone.utc), note_id
+    except (ValueError, TypeError, OverflowError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Cursor non valido"
+        )
+
+
+async def fetch_notes_page(
+    query: Select, skip: int, limit: int, cursor: str, db: AsyncSession
+) -> Response:
+    """Run a notes query with keyset pagination, newest first, setting X-Next-Cursor on full pages"""
+    # Start after the cursor position if provided
+    if cursor:
+        cursor_created_at, cursor_id = decode_cursor(cursor)
+        query = query.where(tuple_(Note.created_at, Note.id) < tuple_(cursor_created_at, cursor_id))
+    query = (
+        query
+        .order_by(Note.created_at.desc(), Note.id.desc())
+        .offset(skip)
+        .limit(limit)
+    )
+    
+    result = await db.execute(query)
+    notes = result.scalars().all()
+    
+    # A full page means there may be more notes after the last one
+    headers = {}
+    if len(notes) == limit:
+        headers["X-Next-Cursor"] = encode_cursor(notes[-1])
+    
+    # Validate the ORM notes and encode them to JSON bytes with pydantic-core, without
+    # intermediate dicts; FastAPI skips its own response_model handling when given a Response
+    content = note_list_adapter.dump_json(note_list_adapter.validate_python(notes))
+    return Response(content=content, media_type="application/json", headers=headers)
 
 
 @router.post("/", response_model=NoteResponse)
 async def create_note(
     note: NoteCreate,
     current_user: User = Depends(get_current_active_user),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_db),
+    redis_client: Redis = Depends(get_redis)
 ):
     """Create a new note"""
     # Get or create tags
@@ -79,43 +211,31 @@ async def create_note(
     db_note = Note(
         title=note.title,
         content=note.content,
-        owner_id=current_user.id
+        owner=current_user
     )
     
-    # Associate tags with note
+    # Associate tags with note, keeping the denormalized names in sync
     db_note.tags = tag_objects
+    db_note.tag_names = sorted(tag.name for tag in tag_objects)
     
     db.add(db_note)
     await db.commit()
-    await db.refresh(db_note)
     
-    # Reload the note with tags to avoid lazy loading issues
-    result = await db.execute(
-        select(Note)
-        .options(selectinload(Note.tags), selectinload(Note.owner))
-        .where(Note.id == db_note.id)
-    )
-    note_with_tags = result.scalar_one()
-    
-    # Convert tags back to names for response
-    note_response = NoteResponse(
-        id=note_with_tags.id,
-        title=note_with_tags.title,
-        content=note_with_tags.content,
-        tags=tags_to_names(note_with_tags.tags),
-        owner_id=note_with_tags.owner_id,
-        owner_username=current_user.username,
-        shared_with=[],  # New note, not shared with anyone yet
-        created_at=note_with_tags.created_at,
-        updated_at=note_with_tags.updated_at
-    )
-    return note_response
+    # Load server-generated columns only: the other attributes and the owner are already
+    # set on the instance and stay loaded since the session doesn't expire on commit
+    await db.refresh(db_note, attribute_names=["created_at", "updated_at", "shared_with_usernames"])
+    
+    if tag_objects:
+        await invalidate_tags_cache(current_user.id, redis_client)
+    
+    return Response(content=serialize_note(db_note), media_type="application/json")
 
 
 @router.get("/", response_model=List[NoteResponse])
 async def get_notes(
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=100),
+    cursor: str = Query(None, description="Cursor from the X-Next-Cursor header of the previous page"),
     search: str = Query(None, description="Search text in title and content"),
     tags: str = Query(None, description="Comma-separated list of tag names to filter by"),
     current_user: User = Depends(get_current_active_user),
@@ -123,20 +243,8 @@ async def get_notes(
 ):
     """Get user's notes and notes shared with user with optional search and tag filtering"""
     
-    # Build base query for user's own notes
-    own_notes_query = (
-        select(Note)
-        .options(selectinload(Note.tags), selectinload(Note.owner))
-        .where(Note.owner_id == current_user.id)
-    )
-    
-    # Build base query for shared notes
-    shared_notes_query = (
-        select(Note)
-        .options(selectinload(Note.tags), selectinload(Note.owner))
-        .join(NoteShare)
-        .where(NoteShare.user_id == current_user.id)
-    )
+    # Build base query for user's accessible notes (own + shared)
+    query = accessible_notes_query(current_user.id)
     
     # Apply text search filter if provided
     if search:
@@ -144,62 +252,16 @@ async def get_notes(
             Note.title.ilike(f"%{search}%"),
             Note.content.ilike(f"%{search}%")
         )
-        own_notes_query = own_notes_query.where(search_filter)
-        shared_notes_query = shared_notes_query.where(search_filter)
+        query = query.where(search_filter)
     
     # Apply tag filter if provided
-    if tags:
-        tag_names = [tag.strip().lower() for tag in tags.split(",") if tag.strip()]
-        if tag_names:
-            # Join with tags table and filter by tag names
-            own_notes_query = (
-                own_notes_query
-                .join(Note.tags)
-                .where(Tag.name.in_(tag_names))
-                .distinct()
-            )
-            shared_notes_query = (
-                shared_notes_query
-                .join(Note.tags)
-                .where(Tag.name.in_(tag_names))
-                .distinct()
-            )
-    
-    # Apply pagination
-    own_notes_query = own_notes_query.offset(skip).limit(limit)
-    shared_notes_query = shared_notes_query.offset(skip).limit(limit)
-    
-    # Execute queries
-    result = await db.execute(own_notes_query)
-    own_notes = result.scalars().all()
-    
-    result = await db.execute(shared_notes_query)
-    shared_notes = result.scalars().all()
-    
-    # Combine and return unique notes
-    all_notes = list(own_notes) + list(shared_notes)
-    unique_notes = list({note.id: note for note in all_notes}.values())
-    
-    # Convert to response format with tags as names
-    note_responses = []
-    for note in unique_notes:
-        # Get shared with usernames for each note (excluding owner)
-        shared_with = await get_shared_with_usernames(note.id, note.owner_id, db)
-        
-        note_response = NoteResponse(
-            id=note.id,
-            title=note.title,
-            content=note.content,
-            tags=tags_to_names(note.tags),
-            owner_id=note.owner_id,
-            owner_username=note.owner.username if note.owner else None,
-            shared_with=shared_with,
-            created_at=note.created_at,
-            updated_at=note.updated_at
-        )
-        note_responses.append(note_response)
+    tag_names = parse_tag_csv(tags)
+    if tag_names:
+        # Match notes having any of the tags, served by the GIN index on tag_names
+        query = query.where(Note.tag_names.overlap(tag_names))
     
-    return note_responses
+    # Apply keyset pagination and execute
+    return await fetch_notes_page(query, skip, limit, cursor, db)
 
 
 
@@ -208,6 +270,7 @@ async def get_notes(
 async def search_notes(
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=100),
+    cursor: str = Query(None, description="Cursor from the X-Next-Cursor header of the previous page"),
     search: str = Query(None, description="Search text in title and content"),
     tags: str = Query(None, description="Comma-separated list of tag names to filter by"),
     current_user: User = Depends(get_current_active_user),
@@ -216,17 +279,7 @@ async def search_notes(
     """Advanced search for notes with multiple filters"""
     
     # Build base query for user's accessible notes (own + shared)
-    query = (
-        select(Note)
-        .options(selectinload(Note.tags), selectinload(Note.owner))
-        .outerjoin(NoteShare, and_(Note.id == NoteShare.note_id, NoteShare.user_id == current_user.id))
-        .where(
-            or_(
-                Note.owner_id == current_user.id,  # User's own notes
-                NoteShare.user_id == current_user.id,  # Notes shared with user
-            )
-        )
-    )
+    query = accessible_notes_query(current_user.id)
     
     # Apply text search filter if provided
     if search:
@@ -237,53 +290,29 @@ async def search_notes(
         query = query.where(search_filter)
     
     # Apply tag filter if provided
-    if tags:
-        tag_names = [tag.strip().lower() for tag in tags.split(",") if tag.strip()]
-        if tag_names:
-            # Join with tags table and filter by tag names
-            query = (
-                query
-                .join(Note.tags)
-                .where(Tag.name.in_(tag_names))
-                .distinct()
-            )
-    
+    tag_names = parse_tag_csv(tags)
+    if tag_names:
+        # Match notes having any of the tags, served by the GIN index on tag_names
+        query = query.where(Note.tag_names.overlap(tag_names))
     
-    # Apply pagination
-    query = query.offset(skip).limit(limit)
-    
-    # Execute query
-    result = await db.execute(query)
-    notes = result.scalars().all()
-    
-    # Convert to response format with tags as names
-    note_responses = []
-    for note in notes:
-        # Get shared with usernames for each note (excluding owner)
-        shared_with = await get_shared_with_usernames(note.id, note.owner_id, db)
-        
-        note_response = NoteResponse(
-            id=note.id,
-            title=note.title,
-            content=note.content,
-            tags=tags_to_names(note.tags),
-            owner_id=note.owner_id,
-            owner_username=note.owner.username if note.owner else None,
-            shared_with=shared_with,
-            created_at=note.created_at,
-            updated_at=note.updated_at
-        )
-        note_responses.append(note_response)
-    
-    return note_responses
+    # Apply keyset pagination and execute
+    return await fetch_notes_page(query, skip, limit, cursor, db)
 
 
 @router.get("/tags", response_model=List[str])
 async def get_all_tags(
     current_user: User = Depends(get_current_active_user),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_db),
+    redis_client: Redis = Depends(get_redis)
 ):
     """Get all available tags from user's own notes only"""
+    cache_key = tags_cache_key(current_user.id)
+    try:
+        cached_tags = await redis_client.get(cache_key)
+    except RedisError:
+        cached_tags = None
+    if cached_tags:
+        return json.loads(cached_tags)
     
     # Get tags only from user's own notes
     query = (
@@ -297,6 +326,12 @@ async def get_all_tags(
     result = await db.execute(query)
     tag_names = [row[0] for row in result.fetchall()]
     
+    # Cached until the user's notes or their tags change
+    try:
+        await redis_client.set(cache_key, json.dumps(tag_names), ex=TAGS_CACHE_TTL_SECONDS)
+    except RedisError:
+        pass
+    
     return tag_names
 
 
@@ -304,6 +339,7 @@ async def get_all_tags(
 async def get_shared_notes(
     skip: int = Query(0, ge=0, description="Number of notes to skip"),
     limit: int = Query(100, ge=1, le=100, description="Number of notes to return"),
+    cursor: str = Query(None, description="Cursor from the X-Next-Cursor header of the previous page"),
     search: str = Query(None, description="Search text in title and content"),
     tags: str = Query(None, description="Comma-separated list of tag names to filter by"),
     current_user: User = Depends(get_current_active_user),
@@ -314,7 +350,7 @@ async def get_shared_notes(
     # Build base query for shared notes only
     query = (
         select(Note)
-        .options(selectinload(Note.tags), selectinload(Note.owner))
+        .options(owner_username_load)
         .join(NoteShare)
         .where(NoteShare.user_id == current_user.id)
     )
@@ -328,106 +364,68 @@ async def get_shared_notes(
         query = query.where(search_filter)
     
     # Apply tag filter if provided
-    if tags:
-        tag_names = [tag.strip().lower() for tag in tags.split(",") if tag.strip()]
-        if tag_names:
-            query = (
-                query
-                .join(Note.tags)
-                .where(Tag.name.in_(tag_names))
-                .distinct()
-            )
-    
-    # Apply pagination
-    query = query.offset(skip).limit(limit)
+    tag_names = parse_tag_csv(tags)
+    if tag_names:
+        # Match notes having any of the tags, served by the GIN index on tag_names
+        query = query.where(Note.tag_names.overlap(tag_names))
     
-    # Execute query
-    result = await db.execute(query)
-    notes = result.scalars().all()
-    
-    # Convert to response format with tags as names
-    note_responses = []
-    for note in notes:
-        # Get shared with usernames for each note (excluding owner)
-        shared_with = await get_shared_with_usernames(note.id, note.owner_id, db)
-        
-        note_response = NoteResponse(
-            id=note.id,
-            title=note.title,
-            content=note.content,
-            tags=tags_to_names(note.tags),
-            owner_id=note.owner_id,
-            owner_username=note.owner.username if note.owner else None,
-            shared_with=shared_with,
-            created_at=note.created_at,
-            updated_at=note.updated_at
-        )
-        note_responses.append(note_response)
-    
-    return note_responses
+    # Apply keyset pagination and execute
+    return await fetch_notes_page(query, skip, limit, cursor, db)
 
 
 @router.get("/{note_id}", response_model=NoteResponse)
 async def get_note(
     note_id: int,
     current_user: User = Depends(get_current_active_user),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_db),
+    redis_client: Redis = Depends(get_redis)
 ):
     """Get a specific note by ID"""
-    # Check if user owns the note
+    # A cached entry exists only for users already authorized to read the note,
+    # and is dropped when the note or its shares change
+    cache_key = note_cache_key(note_id)
+    try:
+        cached_note = await redis_client.hget(cache_key, str(current_user.id))
+    except RedisError:
+        cached_note = None
+    if cached_note:
+        return Response(content=cached_note, media_type="application/json")
+    
+    # Fetch the note if the user owns it or it is shared with them
     result = await db.execute(
         select(Note)
-        .options(selectinload(Note.tags), selectinload(Note.owner))
-        .where(and_(Note.id == note_id, Note.owner_id == current_user.id))
-    )
-    note = result.scalar_one_or_none()
-    
-    if note:
-        # Get shared with usernames for this note (excluding owner)
-        shared_with = await get_shared_with_usernames(note.id, note.owner_id, db)
-        
-        return NoteResponse(
-            id=note.id,
-            title=note.title,
-            content=note.content,
-            tags=tags_to_names(note.tags),
-            owner_id=note.owner_id,
-            owner_username=note.owner.username if note.owner else None,
-            shared_with=shared_with,
-            created_at=note.created_at,
-            updated_at=note.updated_at
+        .options(owner_username_load)
+        .outerjoin(NoteShare, and_(Note.id == NoteShare.note_id, NoteShare.user_id == current_user.id))
+        .where(
+            and_(
+                Note.id == note_id,
+                or_(
+                    Note.owner_id == current_user.id,  # User's own note
+                    NoteShare.user_id.isnot(None),  # Note shared with user
+                )
+            )
         )
-    
-    # Check if note is shared with user
-    result = await db.execute(
-        select(Note)
-        .options(selectinload(Note.tags), selectinload(Note.owner))
-        .join(NoteShare)
-        .where(and_(Note.id == note_id, NoteShare.user_id == current_user.id))
+        .limit(1)
     )
-    note = result.scalar_one_or_none()
+    note = result.scalars().first()
     
-    if note:
-        # Get shared with usernames for this note (excluding owner)
-        shared_with = await get_shared_with_usernames(note.id, note.owner_id, db)
-        
-        return NoteResponse(
-            id=note.id,
-            title=note.title,
-            content=note.content,
-            tags=tags_to_names(note.tags),
-            owner_id=note.owner_id,
-            owner_username=note.owner.username if note.owner else None,
-            shared_with=shared_with,
-            created_at=note.created_at,
-            updated_at=note.updated_at
+    if not note:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Note not found"
         )
     
+    payload = serialize_note(note)
+    try:
+        await cache_note_script(
+            keys=[cache_key],
+            args=[str(current_user.id), payload, NOTE_CACHE_TTL_SECONDS],
+            client=redis_client
+        )
+    except RedisError:
+        pass
     
-    raise HTTPException(
-        status_code=status.HTTP_404_NOT_FOUND,
-        detail="Note not found"
-    )
+    return Response(content=payload, media_type="application/json")
 
 
 @router.put("/{note_id}", response_model=NoteResponse)
@@ -435,30 +433,35 @@ async def update_note(
     note_id: int,
     note_update: NoteUpdate,
     current_user: User = Depends(get_current_active_user),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_db),
+    redis_client: Redis = Depends(get_redis)
 ):
     """Update a note (only owner)"""
-    # Check if user owns the note
-    result = await db.execute(
-        select(Note)
-        .options(selectinload(Note.tags), selectinload(Note.owner))
-        .where(and_(Note.id == note_id, Note.owner_id == current_user.id))
-    )
+    update_data = note_update.model_dump(exclude_unset=True)
+    
+    # The tags collection is only needed when it is being replaced
+    query = select(Note).where(Note.id == note_id)
+    if 'tags' in update_data:
+        query = query.options(selectinload(Note.tags))
+    result = await db.execute(query)
     note = result.scalar_one_or_none()
     
-    if not note:
+    # Check if user owns the note
+    if not note or note.owner_id != current_user.id:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Non hai i permessi sufficienti per aggiornare questa nota"
         )
     
-    # Update note fields
-    update_data = note_update.dict(exclude_unset=True)
+    # The owner is the current user, no need to load it
+    set_committed_value(note, "owner", current_user)
     
-    # Handle tags separately
-    if 'tags' in update_data:
+    # Handle tags separately, keeping the denormalized names in sync
+    tags_changed = 'tags' in update_data
+    if tags_changed:
         tag_objects = await get_or_create_tags(update_data['tags'] or [], db)
         note.tags = tag_objects
+        note.tag_names = sorted(tag.name for tag in tag_objects)
         del update_data['tags']
     
     # Update other fields
@@ -466,46 +469,42 @@ async def update_note(
         setattr(note, field, value)
     
     await db.commit()
-    await db.refresh(note)
+    # Only updated_at is set by the database, the other attributes are already current
+    await db.refresh(note, attribute_names=["updated_at"])
     
-    # Return response with tags as names
-    shared_with = await get_shared_with_usernames(note.id, note.owner_id, db)
+    await invalidate_note_cache(note_id, redis_client)
+    if tags_changed:
+        await invalidate_tags_cache(current_user.id, redis_client)
     
-    note_response = NoteResponse(
-        id=note.id,
-        title=note.title,
-        content=note.content,
-        tags=tags_to_names(note.tags),
-        owner_id=note.owner_id,
-        owner_username=note.owner.username if note.owner else None,
-        shared_with=shared_with,
-        created_at=note.created_at,
-        updated_at=note.updated_at
-    )
-    return note_response
+    return Response(content=serialize_note(note), media_type="application/json")
 
 
 @router.delete("/{note_id}")
 async def delete_note(
     note_id: int,
     current_user: User = Depends(get_current_active_user),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_db),
+    redis_client: Redis = Depends(get_redis)
 ):
     """Delete a note (only owner)"""
+    # Delete and check ownership in one statement, note_shares and note_tags rows cascade
     result = await db.execute(
-        select(Note).where(and_(Note.id == note_id, Note.owner_id == current_user.id))
+        delete(Note)
+        .where(and_(Note.id == note_id, Note.owner_id == current_user.id))
+        .returning(Note.id)
     )
-    note = result.scalar_one_or_none()
     
-    if not note:
+    if result.scalar_one_or_none() is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Nota non trovata o non hai i permessi per eliminarla"
         )
     
-    await db.delete(note)
     await db.commit()
     
+    await invalidate_note_cache(note_id, redis_client)
+    await invalidate_tags_cache(current_user.id, redis_client)
+    
     return {"message": "Nota eliminata con successo"}
 
 
@@ -514,51 +513,41 @@ async def share_note(
     note_id: int,
     user_id: int = Query(..., description="ID of the user to share the note with"),
     current_user: User = Depends(get_current_active_user),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_db),
+    redis_client: Redis = Depends(get_redis)
 ):
     """Share a note with another user (only owner) - read-only access"""
     # Check if current user owns the note
-    result = await db.execute(
-        select(Note).where(and_(Note.id == note_id, Note.owner_id == current_user.id))
-    )
-    note = result.scalar_one_or_none()
-    
-    if not note:
+    if not await user_owns_note(note_id, current_user.id, db):
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Nota non trovata o non hai i permessi per condividere la nota"
         )
     
-    # Check if target user exists
-    result = await db.execute(select(User).where(User.id == user_id))
-    target_user = result.scalar_one_or_none()
-    
-    if not target_user:
+    # Create the share (read-only by default) unless the note is already shared with this user;
+    # a missing target user is reported by the user_id foreign key
+    try:
+        result = await db.execute(
+            pg_insert(NoteShare)
+            .values(note_id=note_id, user_id=user_id)
+            .on_conflict_do_nothing(index_elements=["note_id", "user_id"])
+            .returning(NoteShare.id)
+        )
+    except IntegrityError:
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Utente non trovato"
         )
+    share_id = result.scalar_one_or_none()
+    await db.commit()
     
-    # Check if note is already shared with this user
-    result = await db.execute(
-        select(NoteShare).where(
-            and_(NoteShare.note_id == note_id, NoteShare.user_id == user_id)
-        )
-    )
-    existing_share = result.scalar_one_or_none()
-    
-    if existing_share:
+    if share_id is None:
         # Note is already shared, no need to do anything
         return {"message": f"Nota già condivisa con l'utente {user_id}"}
-    else:
-        # Create new share (read-only by default)
-        note_share = NoteShare(
-            note_id=note_id,
-            user_id=user_id
-        )
-        db.add(note_share)
     
-    await db.commit()
+    # The owner's cached response lists the users the note is shared with
+    await invalidate_note_cache(note_id, redis_client)
     
     return {"message": f"Nota condivisa con l'utente {user_id}"}
 
@@ -568,37 +557,34 @@ async def unshare_note(
     note_id: int,
     user_id: int,
     current_user: User = Depends(get_current_active_user),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_db),
+    redis_client: Redis = Depends(get_redis)
 ):
     """Remove sharing of a note with a user (only owner)"""
     # Check if current user owns the note
-    result = await db.execute(
-        select(Note).where(and_(Note.id == note_id, Note.owner_id == current_user.id))
-    )
-    note = result.scalar_one_or_none()
-    
-    if not note:
+    if not await user_owns_note(note_id, current_user.id, db):
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Nota non trovata o non hai i permessi per smettere di condividere la nota"
         )
     
-    # Find and delete the share
+    # Delete the share in one statement, RETURNING tells whether it existed
     result = await db.execute(
-        select(NoteShare).where(
-            and_(NoteShare.note_id == note_id, NoteShare.user_id == user_id)
-        )
+        delete(NoteShare)
+        .where(and_(NoteShare.note_id == note_id, NoteShare.user_id == user_id))
+        .returning(NoteShare.id)
     )
-    note_share = result.scalar_one_or_none()
     
-    if not note_share:
+    if result.scalar_one_or_none() is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Condivisione non trovata"
         )
     
-    await db.delete(note_share)
     await db.commit()
     
+    # Also revokes the cached response of the user losing access
+    await invalidate_note_cache(note_id, redis_client)
+    
     return {"message": f"Nota smessa di essere condivisa con l'utente {user_id}"}
 
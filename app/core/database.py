@@ -1,11 +1,38 @@
+from uuid import uuid4
+
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
-from sqlalchemy.orm import DeclarativeBase
+from sqlalchemy import event
+from sqlalchemy.orm import DeclarativeBase, Session, raiseload
+from sqlalchemy.pool import NullPool
 from app.core.config import settings
 
+if settings.DB_USE_PGBOUNCER:
+    # PgBouncer does the pooling: don't keep connections here. In transaction mode a
+    # prepared statement may be gone or already exist on the next server connection, so
+    # disable both asyncpg's and SQLAlchemy's statement caches and give every statement
+    # the adapter still prepares a unique name
+    engine_options = {
+        "poolclass": NullPool,
+        "connect_args": {
+            "statement_cache_size": 0,
+            "prepared_statement_cache_size": 0,
+            "prepared_statement_name_func": lambda: f"__asyncpg_{uuid4()}__",
+        },
+    }
+else:
+    engine_options = {
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        "pool_pre_ping": True,
+    }
+
 # Create async engine
 engine = create_async_engine(
     settings.DATABASE_URL.replace("postgresql://", "postgresql+asyncpg://"),
-    echo=settings.DEBUG
+    echo=settings.DEBUG,
+    **engine_options
 )
 
 # Create async session maker
@@ -20,6 +47,15 @@ class Base(DeclarativeBase):
     pass
 
 
+if settings.DEBUG:
+    @event.listens_for(Session, "do_orm_execute")
+    def raise_on_lazy_load(execute_state):
+        """In debug, make every relationship not eagerly loaded by a query raise on access,
+        so N+1 lazy loads show up during development instead of as extra queries"""
+        if execute_state.is_select and not execute_state.is_column_load and not execute_state.is_relationship_load:
+            execute_state.statement = execute_state.statement.options(raiseload("*"))
+
+
 async def get_db() -> AsyncSession:
     async with AsyncSessionLocal() as session:
         try:
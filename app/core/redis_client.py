@@ -1,18 +1,23 @@
 import redis.asyncio as redis
+from fastapi import Request
 from app.core.config import settings
 
-redis_client = None
 
-
-async def get_redis() -> redis.Redis:
-    """Get Redis client"""
-    return redis_client
+async def get_redis(request: Request) -> redis.Redis:
+    """Get the Redis client created at application startup (async so FastAPI skips the threadpool)"""
+    return request.app.state.redis
 
 
-async def init_redis():
+async def init_redis() -> redis.Redis:
     """Initialize Redis connection"""
-    global redis_client
-    redis_client = redis.from_url(settings.REDIS_URL, decode_responses=True)
+    # The client owns a connection pool shared by all requests, bounded so bursts wait
+    # for a free connection instead of opening new ones
+    pool = redis.BlockingConnectionPool.from_url(
+        settings.REDIS_URL,
+        max_connections=settings.REDIS_MAX_CONNECTIONS,
+        decode_responses=True
+    )
+    redis_client = redis.Redis.from_pool(pool)
     
     # Test connection
     try:
@@ -21,3 +26,10 @@ async def init_redis():
     except Exception as e:
         print(f"Redis connection failed: {e}")
         raise
+    
+    return redis_client
+
+
+async def close_redis(redis_client: redis.Redis) -> None:
+    """Close the Redis client and disconnect its connection pool"""
+    await redis_client.aclose()
@@ -1,14 +1,20 @@
+import json
+import time
 from datetime import datetime, timedelta
-from typing import Optional, Union
+from typing import Optional
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import HTTPException, status, Depends
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+from sqlalchemy.orm import make_transient_to_detached
 
 from app.core.config import settings
 from app.core.database import get_db
+from app.core.redis_client import get_redis
 from app.models.user import User
 
 # Password hashing
@@ -72,9 +78,38 @@ def verify_token(token: str, token_type: str = "access") -> dict:
         )
 
 
+def user_cache_key(username: str) -> str:
+    """Redis key holding the cached user for a token subject"""
+    return f"user:{username}"
+
+
+def user_to_cache(user: User) -> str:
+    """Serialize the user fields needed by authenticated endpoints (no password hash)"""
+    return json.dumps({
+        "id": user.id,
+        "username": user.username,
+        "is_active": user.is_active,
+        "created_at": user.created_at.isoformat() if user.created_at else None,
+        "updated_at": user.updated_at.isoformat() if user.updated_at else None,
+    })
+
+
+def user_from_cache(data: str) -> User:
+    """Rebuild a detached User from its cached representation"""
+    fields = json.loads(data)
+    for field in ("created_at", "updated_at"):
+        if fields[field]:
+            fields[field] = datetime.fromisoformat(fields[field])
+    user = User(**fields)
+    # Mark the instance as clean and persistent-looking so it can be merged without a SELECT
+    make_transient_to_detached(user)
+    return user
+
+
 async def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_db),
+    redis_client: Redis = Depends(get_redis)
 ) -> User:
     """Get current authenticated user"""
     token = credentials.credentials
@@ -88,6 +123,18 @@ async def get_current_user(
             headers={"WWW-Authenticate": "Bearer"},
         )
     
+    # Note: is_active is cached for the token lifetime too, so deactivating a user directly
+    # in the database takes effect only once this entry expires (or is deleted on logout)
+    cache_key = user_cache_key(username)
+    try:
+        cached_user = await redis_client.get(cache_key)
+    except RedisError:
+        # Fall back to the database when Redis is unavailable
+        cached_user = None
+    if cached_user:
+        # Attach the cached user to the session without querying the database
+        return await db.merge(user_from_cache(cached_user), load=False)
+    
     result = await db.execute(select(User).where(User.username == username))
     user = result.scalar_one_or_none()
     
@@ -98,6 +145,14 @@ async def get_current_user(
             headers={"WWW-Authenticate": "Bearer"},
         )
     
+    # Cache the user for as long as the token is valid
+    ttl = int(payload["exp"] - time.time())
+    if ttl > 0:
+        try:
+            await redis_client.setex(cache_key, ttl, user_to_cache(user))
+        except RedisError:
+            pass
+    
     return user
 
 
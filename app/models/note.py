@@ -1,11 +1,23 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Boolean
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Index
 from sqlalchemy.sql import func
+from sqlalchemy.dialects.postgresql import ARRAY
 from sqlalchemy.orm import relationship
 from app.core.database import Base
 
 
 class Note(Base):
     __tablename__ = "notes"
+    __table_args__ = (
+        # Supports owner lookups and the owner's notes in keyset pagination order
+        Index("ix_notes_owner_created_at_id", "owner_id", "created_at", "id"),
+        # Supports keyset pagination ordered by (created_at, id), scanned backwards for DESC
+        Index("ix_notes_created_at_id", "created_at", "id"),
+        # Trigram indexes so ILIKE '%term%' searches don't scan the whole table (requires pg_trgm)
+        Index("ix_notes_title_trgm", "title", postgresql_using="gin", postgresql_ops={"title": "gin_trgm_ops"}),
+        Index("ix_notes_content_trgm", "content", postgresql_using="gin", postgresql_ops={"content": "gin_trgm_ops"}),
+        # Supports the tag filter (tag_names && :names)
+        Index("ix_notes_tag_names", "tag_names", postgresql_using="gin"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String(200), nullable=False)
@@ -13,8 +25,14 @@ class Note(Base):
     owner_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    # Usernames the note is shared with (excluding owner), maintained by database triggers
+    # on note_shares and users.username
+    shared_with_usernames = Column(ARRAY(String(50)), nullable=False, server_default="{}")
+    # Tag names of the note, kept in sync with the tags relationship by the endpoints that set tags
+    tag_names = Column(ARRAY(String(50)), nullable=False, server_default="{}")
 
     # Relationships
     owner = relationship("User", back_populates="notes")
-    shared_with = relationship("NoteShare", back_populates="note", cascade="all, delete-orphan")
-    tags = relationship("Tag", secondary="note_tags", back_populates="notes")
+    shared_with = relationship("NoteShare", back_populates="note", cascade="all, delete-orphan", passive_deletes=True)
+    # Never lazy load tags: reads use tag_names, writes must opt in with selectinload(Note.tags)
+    tags = relationship("Tag", secondary="note_tags", back_populates="notes", lazy="raise")
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, DateTime, ForeignKey, Index, UniqueConstraint
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from app.core.database import Base
@@ -6,9 +6,14 @@ from app.core.database import Base
 
 class NoteShare(Base):
     __tablename__ = "note_shares"
+    __table_args__ = (
+        UniqueConstraint("note_id", "user_id", name="uq_note_shares_note_user"),
+        # Supports the "notes shared with user" join used by the list endpoints
+        Index("ix_note_shares_user_note", "user_id", "note_id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
-    note_id = Column(Integer, ForeignKey("notes.id"), nullable=False)
+    note_id = Column(Integer, ForeignKey("notes.id", ondelete="CASCADE"), nullable=False)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
@@ -1,9 +1,9 @@
 from .user import UserCreate, UserResponse, UserLogin
-from .note import NoteCreate, NoteUpdate, NoteResponse
+from .note import NoteCreate, NoteUpdate, NoteResponse, note_list_adapter
 from .auth import Token, TokenData
 
 __all__ = [
     "UserCreate", "UserResponse", "UserLogin",
-    "NoteCreate", "NoteUpdate", "NoteResponse",
+    "NoteCreate", "NoteUpdate", "NoteResponse", "note_list_adapter",
     "Token", "TokenData"
 ]
@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict, Field, AliasPath, TypeAdapter
 from datetime import datetime
 from typing import Optional, List
 
@@ -6,7 +6,7 @@ from typing import Optional, List
 class NoteBase(BaseModel):
     title: str
     content: Optional[str] = None
-    tags: Optional[List[str]] = []
+    tags: Optional[List[str]] = Field(default_factory=list)
 
 
 class NoteCreate(NoteBase):
@@ -20,12 +20,19 @@ class NoteUpdate(BaseModel):
 
 
 class NoteResponse(NoteBase):
+    # Built only by the server from ORM notes and never modified afterwards; fields can also
+    # be set by name, e.g. when validating the API's own JSON output
+    model_config = ConfigDict(from_attributes=True, populate_by_name=True, frozen=True, revalidate_instances="never")
+
+    tags: Optional[List[str]] = Field(default_factory=list, validation_alias="tag_names")
     id: int
     owner_id: int
-    owner_username: Optional[str] = None
-    shared_with: Optional[List[str]] = []  # List of usernames who have access to this note (excluding owner)
+    owner_username: Optional[str] = Field(default=None, validation_alias=AliasPath("owner", "username"))
+    # List of usernames who have access to this note (excluding owner), denormalized on the notes table
+    shared_with: Optional[List[str]] = Field(default_factory=list, validation_alias="shared_with_usernames")
     created_at: datetime
     updated_at: Optional[datetime] = None
 
-    class Config:
-        from_attributes = True
+
+# Validates and serializes lists of notes, built once and shared by the list endpoints
+note_list_adapter = TypeAdapter(List[NoteResponse])
@@ -1,13 +1,15 @@
-import uvicorn
-from starlette.middleware.base import BaseHTTPMiddleware
+import re
 
-from fastapi import FastAPI, Request
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
 from contextlib import asynccontextmanager
 
 from app.core.config import settings
-from app.core.redis_client import init_redis
+from app.core.redis_client import init_redis, close_redis
 from app.api.v1.api import api_router
 
 
@@ -15,74 +17,92 @@ from app.api.v1.api import api_router
 async def lifespan(app: FastAPI):
     # Startup
     # Note: Database tables are managed by Alembic migrations
-    await init_redis()
+    app.state.redis = await init_redis()
     yield
     # Shutdown
-    pass
-
-
-class HTTPSRedirectMiddleware(BaseHTTPMiddleware):
+    await close_redis(app.state.redis)
+
+
+# Matches CloudFront's user agent without lowercasing the header value
+search_cloudfront_user_agent = re.compile(rb"cloudfront", re.IGNORECASE).search
+# Headers set by CloudFront on the requests it forwards
+CLOUDFRONT_HEADERS = frozenset({b"x-amz-cf-id", b"x-from-cloudfront"})
+# Header values a proxy sets when the original request was HTTPS
+FORWARDED_HTTPS_HEADERS = frozenset({
+    (b"x-forwarded-proto", b"https"),
+    (b"x-forwarded-ssl", b"on"),
+    (b"x-forwarded-scheme", b"https"),
+    (b"x-forwarded-port", b"443"),
+})
+REDIRECT_STATUS_CODES = frozenset({301, 302, 303, 307, 308})
+
+
+def request_is_https(scope: Scope) -> bool:
+    """Tell whether the original request was HTTPS from the proxy headers, in one pass
+    over the raw header pairs that stops at the first header proving it"""
+    user_agent = b""
+    is_cloudfront = False
+    for name, value in scope["headers"]:
+        if (name, value) in FORWARDED_HTTPS_HEADERS:
+            # We're behind a proxy and the original request was HTTPS
+            return True
+        if name in CLOUDFRONT_HEADERS:
+            is_cloudfront = True
+        elif name == b"user-agent":
+            user_agent = value
+    
+    # Special case: if we're behind CloudFront and the request URL is HTTPS,
+    # but x-forwarded-proto is http, assume the original was HTTPS
+    if scope.get("scheme") != "https":
+        return False
+    return is_cloudfront or search_cloudfront_user_agent(user_agent) is not None
+
+
+class HTTPSRedirectMiddleware:
     """Middleware to ensure HTTPS redirects use the correct protocol"""
-    async def dispatch(self, request: Request, call_next):
+    def __init__(self, app: ASGIApp):
+        self.app = app
 
-        if settings.DEBUG:
-            response = await call_next(request)
-            return response
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or settings.DEBUG:
+            await self.app(scope, receive, send)
+            return
         
-        # Check if we're behind CloudFront or other proxy
-        is_cloudfront = (
-            "cloudfront" in request.headers.get("user-agent", "").lower() or
-            "x-amz-cf-id" in request.headers or
-            "x-from-cloudfront" in request.headers
-        )
-        
-        # Check if we're behind a proxy and the original request was HTTPS
-        is_https = (
-            request.headers.get("x-forwarded-proto") == "https" or
-            request.headers.get("x-forwarded-ssl") == "on" or
-            request.headers.get("x-forwarded-scheme") == "https" or
-            request.headers.get("x-forwarded-port") == "443"
-        )
-        
-        # Special case: if we're behind CloudFront and the request URL is HTTPS,
-        # but x-forwarded-proto is http, assume the original was HTTPS
-        if is_cloudfront and str(request.url).startswith("https://"):
-            is_https = True
+        is_https = request_is_https(scope)
         
         if is_https:
             # Force the request to use HTTPS scheme
-            request.scope["scheme"] = "https"
-            # Also set the host to use HTTPS
-            if "host" in request.scope:
-                host = request.scope["host"]
-                if not host.startswith("https://"):
-                    request.scope["host"] = f"https://{host}"
-        response = await call_next(request)
+            scope["scheme"] = "https"
         
-        # If this is a redirect response, ensure it uses HTTPS
-        if response.status_code in [301, 302, 303, 307, 308]:
-            location = response.headers.get("location")
-            if location:
-                # Handle both absolute and relative URLs
-                if location.startswith("http://"):
-                    # Replace http:// with https:// in the location header
-                    https_location = location.replace("http://", "https://", 1)
-                    response.headers["location"] = https_location
-                elif location.startswith("/") and is_https:
-                    # For relative URLs, construct the full HTTPS URL
-                    host = request.headers.get("host", "")
-                    if host:
-                        https_location = f"https://{host}{location}"
-                        response.headers["location"] = https_location
+        async def send_with_https_location(message: Message):
+            # If this is a redirect response, ensure it uses HTTPS
+            if message["type"] == "http.response.start" and message["status"] in REDIRECT_STATUS_CODES:
+                # ASGI allows any iterable of header pairs, copy it to edit in place
+                response_headers = message["headers"] = list(message.get("headers", []))
+                for index, (name, location) in enumerate(response_headers):
+                    if name != b"location":
+                        continue
+                    # Handle both absolute and relative URLs
+                    if location.startswith(b"http://"):
+                        # Replace http:// with https:// in the location header
+                        response_headers[index] = (name, b"https://" + location[7:])
+                    elif location.startswith(b"/") and is_https:
+                        # For relative URLs, construct the full HTTPS URL
+                        host = next((value for key, value in scope["headers"] if key == b"host"), b"")
+                        if host:
+                            response_headers[index] = (name, b"https://" + host + location)
+                    break
+            await send(message)
         
-        return response
+        await self.app(scope, receive, send_with_https_location)
 
 
 app = FastAPI(
     title="Shared Notes API",
     description="A RESTful API for taking and sharing notes",
     version="1.0.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
 )
 
 # Add HTTPS redirect middleware FIRST (always active to handle proxy scenarios)
@@ -95,13 +115,15 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],  # Pagination cursor of the notes list endpoints
+    max_age=7200,  # Let browsers reuse preflight results for 2 hours (Chromium's cap)
 )
 
-# Add trusted host middleware for production
-if not settings.DEBUG:
+# Add trusted host middleware for production, skipped when any host is allowed
+if not settings.DEBUG and "*" not in settings.allowed_hosts_list:
     app.add_middleware(
         TrustedHostMiddleware,
-        allowed_hosts=["*"]  # Configure with your actual domains in production
+        allowed_hosts=settings.allowed_hosts_list
     )
 
 # Include API router
@@ -121,11 +143,16 @@ async def health_check():
 
 
 if __name__ == "__main__":
+    # Imported here so ASGI servers importing main:app don't load uvicorn's CLI stack
+    import uvicorn
+
     uvicorn.run(
         "main:app",
         host="0.0.0.0",
         port=8000,
         reload=settings.DEBUG,
         proxy_headers=True,  # Enable proxy headers support
-        forwarded_allow_ips="*"  # Allow forwarded headers from any IP
+        forwarded_allow_ips="*",  # Allow forwarded headers from any IP
+        loop="uvloop",  # Fail at startup rather than silently falling back to asyncio
+        http="httptools"
     )